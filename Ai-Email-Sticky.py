@@ -5,10 +5,15 @@
 # - ❌ delete button
 # - Header buttons: Poll Now, Clear Completed
 # - NEW: When a task is completed, ALL text in the note turns subtle green (#6A9955)
-# Logic (polling, AI, dedup, cutoff, leave-unread, etc.) unchanged.
+# Polling: one persistent IMAP session, batched FETCH/STORE; new emails are triaged
+# concurrently (fused classify + summary call, cached by message hash) and stored
+# in one transaction per poll.
 
-import imaplib, email, re, time, threading, sqlite3, json, os, configparser, logging, logging.handlers
+import imaplib, email, re, threading, queue, asyncio, hashlib, sqlite3, json, os, configparser, logging, logging.handlers
+from contextlib import contextmanager
+from functools import lru_cache
 from datetime import datetime, timedelta, timezone
+from email import policy as email_policy
 from email.utils import parsedate_to_datetime, parseaddr
 from pathlib import Path
 import tkinter as tk
@@ -19,10 +24,11 @@ LAST_AI_ERROR = ""
 
 try:
     import openai as _openai_pkg
-    from openai import OpenAI
+    from openai import OpenAI, AsyncOpenAI
 except Exception:
     _openai_pkg = None
     OpenAI = None
+    AsyncOpenAI = None
 
 APP_DIR = Path.home() / ".ai_email_sticky"
 APP_DIR.mkdir(exist_ok=True)
@@ -48,111 +54,211 @@ def setup_logging():
 log = setup_logging()
 
 # ----------------- Persistence -----------------
+# One shared connection for the UI + poller threads; every access goes through _LOCK.
+# WAL lets the UI's SELECTs run while the poller is writing. Re-entrant so helpers can
+# run inside a db_batch() held by the same thread.
+_CONN = None
+_LOCK = threading.RLock()
+
+# Hot statements (poller runs these per UID, the UI every refresh). Keeping the SQL text
+# constant lets sqlite3's statement cache hand back the compiled plan instead of re-parsing.
+SQL_UID_PROCESSED = "SELECT 1 FROM processed_uids WHERE email_uid=?"
+SQL_MARK_UID      = "INSERT OR IGNORE INTO processed_uids(email_uid) VALUES(?)"
+SQL_ADD_TASK      = """INSERT INTO tasks (email_uid, subject, snippet, task_text, sender, received_at, summary, created_at)
+                       VALUES (?,?,?,?,?,?,?,?)"""
+SQL_ARCHIVE_OLD   = """UPDATE tasks SET archived_at=?
+                       WHERE archived_at IS NULL AND is_completed=1 AND completed_at < ?"""
+# Counts come from the fetched rows; window sums here would force a temp-b-tree sort.
+SQL_ACTIVE_TASKS  = """SELECT id, sender, received_at, summary, is_completed, completed_at, subject
+                       FROM tasks WHERE archived_at IS NULL
+                       ORDER BY is_completed, id DESC"""
+SQL_AI_CACHE_GET  = "SELECT label, summary FROM ai_cache WHERE key=?"
+SQL_AI_CACHE_PUT  = "INSERT OR REPLACE INTO ai_cache(key, label, summary, created_at) VALUES(?,?,?,?)"
+AI_CACHE_DAYS = 30
+_CURSORS = {}
+
+def _cursor(sql):
+    # One reusable cursor per hot statement; caller must hold _LOCK.
+    cur = _CURSORS.get(sql)
+    if cur is None:
+        cur = _CURSORS[sql] = _CONN.cursor()
+    return cur
+
 def ensure_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""CREATE TABLE IF NOT EXISTS tasks (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        email_uid TEXT, subject TEXT, snippet TEXT,
-        task_text TEXT NOT NULL,
-        created_at TEXT NOT NULL,
-        completed_at TEXT, is_completed INTEGER DEFAULT 0,
-        archived_at TEXT
-    )""")
-    cur.execute("""CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT)""")
-    cur.execute("""CREATE TABLE IF NOT EXISTS processed_uids (email_uid TEXT PRIMARY KEY)""")
-    cur.execute("""CREATE INDEX IF NOT EXISTS idx_tasks_email_uid ON tasks(email_uid)""")
-    conn.commit(); conn.close()
+    global _CONN
+    if _CONN is None:
+        _CONN = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None, cached_statements=256)
+        _CONN.execute("PRAGMA journal_mode=WAL")
+        _CONN.execute("PRAGMA synchronous=NORMAL")
+        _CONN.execute("PRAGMA temp_store=MEMORY")
+        _CONN.execute("PRAGMA cache_size=-65536")
+        _CONN.execute("PRAGMA busy_timeout=60000")
+    with _LOCK:
+        _CONN.execute("""CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email_uid TEXT, subject TEXT, snippet TEXT,
+            task_text TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            completed_at TEXT, is_completed INTEGER DEFAULT 0,
+            archived_at TEXT,
+            sender TEXT, received_at TEXT, summary TEXT
+        )""")
+        _migrate_task_fields()
+        _CONN.execute("""CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT)""")
+        _CONN.execute("""CREATE TABLE IF NOT EXISTS processed_uids (email_uid TEXT PRIMARY KEY)""")
+        _CONN.execute("""CREATE TABLE IF NOT EXISTS ai_cache (
+            key TEXT PRIMARY KEY, label TEXT, summary TEXT, created_at TEXT
+        )""")
+        prune_ai_cache()
+        _CONN.execute("""CREATE INDEX IF NOT EXISTS idx_tasks_email_uid ON tasks(email_uid)""")
+        # Partial indexes: active-list ORDER BY, and the retention-archive cutoff UPDATE.
+        # ANALYZE only when they are first created; close_db() runs PRAGMA optimize after that.
+        new_index = _CONN.execute("""SELECT COUNT(*) FROM sqlite_master WHERE type='index'
+                                     AND name IN ('idx_tasks_active', 'idx_tasks_completed_at')""").fetchone()[0] < 2
+        _CONN.execute("""CREATE INDEX IF NOT EXISTS idx_tasks_active ON tasks(is_completed, id DESC)
+                         WHERE archived_at IS NULL""")
+        _CONN.execute("""CREATE INDEX IF NOT EXISTS idx_tasks_completed_at ON tasks(completed_at)
+                         WHERE is_completed=1 AND archived_at IS NULL""")
+        if new_index:
+            _CONN.execute("ANALYZE")
+
+_RE_FROM = re.compile(r"From:\s*(.*?)\s*\|")
+_RE_RECV = re.compile(r"Received:\s*([^|]+)")
+_RE_SUMM = re.compile(r"Summary:\s*(.*)$")
+
+def _migrate_task_fields():
+    # Older DBs only have the formatted "From: .. | Received: .. | Summary: .." line in task_text;
+    # add the split-out columns and backfill them once. Caller must hold _LOCK.
+    cols = {r[1] for r in _CONN.execute("PRAGMA table_info(tasks)")}
+    for col in ("sender", "received_at", "summary"):
+        if col not in cols:
+            _CONN.execute(f"ALTER TABLE tasks ADD COLUMN {col} TEXT")
+    todo = _CONN.execute("SELECT id, task_text FROM tasks WHERE summary IS NULL").fetchall()
+    if not todo:
+        return
+    fixed = []
+    for tid, text in todo:
+        from_match = _RE_FROM.search(text)
+        recv_match = _RE_RECV.search(text)
+        summ_match = _RE_SUMM.search(text)
+        fixed.append((from_match.group(1).strip() if from_match else "",
+                      recv_match.group(1).strip() if recv_match else "",
+                      summ_match.group(1).strip() if summ_match else text,
+                      tid))
+    _CONN.execute("BEGIN")
+    _CONN.executemany("UPDATE tasks SET sender=?, received_at=?, summary=? WHERE id=?", fixed)
+    _CONN.execute("COMMIT")
+    log.info("Backfilled sender/received/summary for %d task(s)", len(fixed))
+
+def close_db():
+    global _CONN
+    with _LOCK:
+        if _CONN is not None:
+            _CURSORS.clear()
+            try:
+                _CONN.execute("PRAGMA optimize")
+            except sqlite3.Error:
+                pass
+            _CONN.close()
+            _CONN = None
+
+def utc_now_iso(dt=None):
+    # Stored timestamps are ISO-8601 UTC, so they compare correctly as plain strings in SQL.
+    return (dt or datetime.now(timezone.utc)).isoformat(timespec="seconds")
+
+@contextmanager
+def db_batch():
+    # Group helper calls into one transaction: commit on exit, roll back on error.
+    # Holds _LOCK throughout so the other thread's writes can't land inside it.
+    with _LOCK:
+        _CONN.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            _CONN.execute("ROLLBACK")
+            raise
+        _CONN.execute("COMMIT")
 
 def save_metadata(key, value):
-    conn = sqlite3.connect(DB_PATH); cur = conn.cursor()
-    cur.execute("INSERT INTO metadata(key,value) VALUES(?,?) ON CONFLICT(key) DO UPDATE SET value=excluded.value", (key, str(value)))
-    conn.commit(); conn.close()
+    with _LOCK:
+        _CONN.execute("INSERT INTO metadata(key,value) VALUES(?,?) ON CONFLICT(key) DO UPDATE SET value=excluded.value", (key, str(value)))
 
 def get_metadata(key, default=None):
-    conn = sqlite3.connect(DB_PATH); cur = conn.cursor()
-    cur.execute("SELECT value FROM metadata WHERE key=?", (key,))
-    row = cur.fetchone(); conn.close()
+    with _LOCK:
+        row = _CONN.execute("SELECT value FROM metadata WHERE key=?", (key,)).fetchone()
     return row[0] if row else default
 
 def is_uid_processed(uid):
-    conn = sqlite3.connect(DB_PATH); cur = conn.cursor()
-    cur.execute("SELECT 1 FROM processed_uids WHERE email_uid=?", (uid,))
-    ok = cur.fetchone() is not None
-    conn.close(); return ok
+    with _LOCK:
+        return _cursor(SQL_UID_PROCESSED).execute(SQL_UID_PROCESSED, (uid,)).fetchone() is not None
 
 def mark_uid_processed(uid):
-    conn = sqlite3.connect(DB_PATH); cur = conn.cursor()
-    cur.execute("INSERT OR IGNORE INTO processed_uids(email_uid) VALUES(?)", (uid,))
-    conn.commit(); conn.close()
-
-def add_task(task_text, subject="", snippet="", email_uid=None):
+    with _LOCK:
+        _cursor(SQL_MARK_UID).execute(SQL_MARK_UID, (uid,))
+
+def ai_cache_key(subject, body, *extra):
+    # Exact-match key: same newsletter / auto-reply -> same key. extra = model + which calls ran.
+    h = hashlib.blake2b(digest_size=16)
+    for part in (*extra, subject or "", body[:6000]):
+        h.update(str(part).encode("utf-8", "ignore") + b"\x00")
+    return h.hexdigest()
+
+def get_ai_cache(key):
+    with _LOCK:
+        return _cursor(SQL_AI_CACHE_GET).execute(SQL_AI_CACHE_GET, (key,)).fetchone()
+
+def prune_ai_cache():
+    with _LOCK:
+        _CONN.execute("DELETE FROM ai_cache WHERE created_at < ?",
+                      (utc_now_iso(datetime.now(timezone.utc) - timedelta(days=AI_CACHE_DAYS)),))
+
+def put_ai_cache(key, label, summary):
+    with _LOCK:
+        _cursor(SQL_AI_CACHE_PUT).execute(SQL_AI_CACHE_PUT, (key, label, summary, utc_now_iso()))
+
+def add_task(sender, received_at, summary, subject="", snippet="", email_uid=None, now_iso=None):
     if email_uid and is_uid_processed(email_uid):
         log.info("Skip duplicate UID=%s (already processed)", email_uid)
         return False
-    conn = sqlite3.connect(DB_PATH); cur = conn.cursor()
-    cur.execute("INSERT INTO tasks (email_uid, subject, snippet, task_text, created_at) VALUES (?,?,?,?,?)",
-                (email_uid, subject, snippet, task_text, datetime.utcnow().isoformat()))
-    conn.commit(); conn.close()
+    task_text = f"From: {sender} | Received: {received_at} | Summary: {summary}"
+    with _LOCK:
+        _cursor(SQL_ADD_TASK).execute(SQL_ADD_TASK, (email_uid, subject, snippet, task_text,
+                                                     sender, received_at, summary, now_iso or utc_now_iso()))
     if email_uid:
         mark_uid_processed(email_uid)
     log.info("Added task (UID=%s): %s", email_uid, task_text[:160])
     return True
 
 def list_active_tasks(retention_hours=12, return_counts=False):
-    cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
-    conn = sqlite3.connect(DB_PATH); cur = conn.cursor()
-    cur.execute("""SELECT id, task_text, is_completed, completed_at, subject
-                   FROM tasks WHERE archived_at IS NULL
-                   ORDER BY is_completed, id DESC""")
-    rows = cur.fetchall()
-    # Archive completed items older than retention
-    to_archive = []
-    for tid, _, done, comp_at, _ in rows:
-        if done and comp_at:
-            try:
-                if datetime.fromisoformat(comp_at) < cutoff:
-                    to_archive.append(tid)
-            except Exception:
-                pass
-    if to_archive:
-        now = datetime.utcnow().isoformat()
-        q = ",".join("?" for _ in to_archive)
-        cur.execute(f"UPDATE tasks SET archived_at=? WHERE id IN ({q})", [now, *to_archive])
-        conn.commit()
-        cur.execute("""SELECT id, task_text, is_completed, completed_at, subject
-                       FROM tasks WHERE archived_at IS NULL
-                       ORDER BY is_completed, id DESC""")
-        rows = cur.fetchall()
-
-    cur.execute("SELECT COUNT(*) FROM tasks WHERE archived_at IS NULL AND is_completed=0")
-    active_count = cur.fetchone()[0]
-    cur.execute("SELECT COUNT(*) FROM tasks WHERE archived_at IS NULL AND is_completed=1")
-    completed_count = cur.fetchone()[0]
-    conn.close()
+    now = datetime.now(timezone.utc)
+    # completed_at is stored as ISO-8601, which sorts lexicographically -> compare as strings
+    cutoff = utc_now_iso(now - timedelta(hours=retention_hours))
+    with _LOCK:
+        # Archive completed items older than retention
+        _cursor(SQL_ARCHIVE_OLD).execute(SQL_ARCHIVE_OLD, (utc_now_iso(now), cutoff))
+        rows = _cursor(SQL_ACTIVE_TASKS).execute(SQL_ACTIVE_TASKS).fetchall()
+    completed_count = sum(1 for r in rows if r[4])
+    active_count = len(rows) - completed_count
     if return_counts:
         return rows, active_count, completed_count
     return rows
 
 def mark_task_completed(task_id, done=True):
-    conn = sqlite3.connect(DB_PATH); cur = conn.cursor()
-    if done:
-        cur.execute("UPDATE tasks SET is_completed=1, completed_at=? WHERE id=?", (datetime.utcnow().isoformat(), task_id))
-    else:
-        cur.execute("UPDATE tasks SET is_completed=0, completed_at=NULL WHERE id=?", (task_id,))
-    conn.commit(); conn.close()
+    with _LOCK:
+        if done:
+            _CONN.execute("UPDATE tasks SET is_completed=1, completed_at=? WHERE id=?", (utc_now_iso(), task_id))
+        else:
+            _CONN.execute("UPDATE tasks SET is_completed=0, completed_at=NULL WHERE id=?", (task_id,))
 
 def delete_task(task_id):
-    conn = sqlite3.connect(DB_PATH); cur = conn.cursor()
-    cur.execute("DELETE FROM tasks WHERE id=?", (task_id,)); conn.commit(); conn.close()
+    with _LOCK:
+        _CONN.execute("DELETE FROM tasks WHERE id=?", (task_id,))
 
 def archive_all_completed_now():
-    conn = sqlite3.connect(DB_PATH); cur = conn.cursor()
-    now = datetime.utcnow().isoformat()
-    cur.execute("UPDATE tasks SET archived_at=? WHERE archived_at IS NULL AND is_completed=1", (now,))
-    count = cur.rowcount
-    conn.commit(); conn.close()
-    return count
+    now = utc_now_iso()
+    with _LOCK:
+        cur = _CONN.execute("UPDATE tasks SET archived_at=? WHERE archived_at IS NULL AND is_completed=1", (now,))
+        return cur.rowcount
 
 # ----------------- Config -----------------
 def load_config():
@@ -174,7 +280,8 @@ def load_config():
             "api_key":"",
             "base_url":"",
             "classify_before_add":"true",
-            "drop_labels":"marketing, fyi"
+            "drop_labels":"marketing, fyi",
+            "max_concurrency":"5"
         }
         cfg["app"] = {"retention_hours":"12","poll_seconds":"300","ui_refresh_seconds":"30"}
         cfg["ui"]  = {"font_size":"10","always_on_top":"true","theme":"light","colorful_text":"true"}
@@ -182,89 +289,165 @@ def load_config():
     cfg.read(CONFIG_PATH)
     return cfg
 
+@lru_cache(maxsize=64)
+def _parse_bool(raw):
+    raw = raw.split(";",1)[0].split("#",1)[0].strip().lower()
+    return raw in ("1","true","t","yes","y","on")
+
 def get_bool(cfg, section, option, fallback=False):
+    # Only the string parse is memoized: keying on the cfg object would miss runtime cfg.set()
     try:
         raw = cfg.get(section, option, fallback=str(fallback))
     except Exception:
         return fallback
-    raw = str(raw).split(";",1)[0].split("#",1)[0].strip().lower()
-    return raw in ("1","true","t","yes","y","on")
+    return _parse_bool(str(raw))
 
 # ----------------- Summaries + AI -----------------
+_WS_RE = re.compile(r"\s+")
+HEURISTIC_MAX_LINES = 50
+
 def heuristic_summary(text, max_len=140):
-    for line in text.splitlines():
+    # Look at the first HEURISTIC_MAX_LINES lines only; split() stops there instead of
+    # materializing every line of the body.
+    for line in text.split("\n", HEURISTIC_MAX_LINES)[:HEURISTIC_MAX_LINES]:
         s = line.strip()
         if s and not s.startswith(">"):
-            s = re.sub(r"\s+", " ", s)
+            s = _WS_RE.sub(" ", s)
             return (s[:max_len]).rstrip()
-    return (text.strip().replace("\n"," ")[:max_len]).rstrip()
-
-def llm_summary(text, subject, model="gpt-5-mini", api_key=None, base_url=None, temperature=1, max_len=140):
+    return (text.lstrip()[:max_len].replace("\n"," ")).rstrip()
+
+def _summary_prompt(text, subject, max_len):
+    return (
+        "Summarize this email into a single concise action-oriented sentence "
+        f"(<= {max_len} characters). No preamble, no quotes — just the sentence.\n\n"
+        f"Subject: {subject}\n\n{text[:6000]}"
+    )
+
+def _clean_summary(out, text, max_len):
+    out = re.sub(r"^\W+|\W+$", "", (out or "").strip())
+    return out[:max_len].strip() or heuristic_summary(text, max_len)
+
+def _classify_prompt(text, subject):
+    return (
+        "Classify this email for triage with ONE WORD only:\n"
+        "actionable = asks me to do something or likely needs a response\n"
+        "fyi        = informational only, no action needed\n"
+        "marketing  = promo/sales/newsletter/offer\n\n"
+        f"Subject: {subject}\n\n{text[:3000]}\n\n"
+        "Answer with exactly one label: actionable or fyi or marketing."
+    )
+
+def _parse_label(raw):
+    label = (raw or "").strip().lower()
+    if "market" in label:
+        return "marketing"
+    if "fyi" in label:
+        return "fyi"
+    return "actionable"
+
+def _triage_prompt(text, subject, max_len):
+    # Fused classify + summarize: one request, one copy of the email in the prompt
+    return (
+        "Triage this email. Return a JSON object with exactly two keys:\n"
+        '  "label":   one of "actionable", "fyi", "marketing"\n'
+        "             actionable = asks me to do something or likely needs a response\n"
+        "             fyi        = informational only, no action needed\n"
+        "             marketing  = promo/sales/newsletter/offer\n"
+        f'  "summary": a single concise action-oriented sentence (<= {max_len} characters), no preamble\n\n'
+        f"Subject: {subject}\n\n{text[:6000]}"
+    )
+
+def _parse_triage(raw, text, max_len):
+    data = json.loads(raw or "{}")
+    return _parse_label(str(data.get("label", ""))), _clean_summary(str(data.get("summary", "")), text, max_len)
+
+def ai_triage(text, subject, model="gpt-5-mini", api_key=None, base_url=None, temperature=1, max_len=140):
+    """Returns (label, summary, mode) from a single completion."""
     global LAST_AI_ERROR
     if OpenAI is None:
         LAST_AI_ERROR = "OpenAI SDK not importable; install with: pip install openai"
-        return heuristic_summary(text, max_len), "OFF"
+        return "actionable", heuristic_summary(text, max_len), "OFF"
     api_key = api_key or os.getenv("OPENAI_API_KEY","")
     if not api_key:
         LAST_AI_ERROR = "OPENAI_API_KEY not set (env var or [ai] api_key)."
-        return heuristic_summary(text, max_len), "OFF"
+        return "actionable", heuristic_summary(text, max_len), "OFF"
     try:
         kwargs = {"api_key": api_key}
         if base_url:
             kwargs["base_url"] = base_url
         client = OpenAI(**kwargs)
-        prompt = (
-            "Summarize this email into a single concise action-oriented sentence "
-            f"(<= {max_len} characters). No preamble, no quotes — just the sentence.\n\n"
-            f"Subject: {subject}\n\n{text[:6000]}"
-        )
         r = client.chat.completions.create(
             model=model, temperature=float(temperature),
-            messages=[{"role":"user","content":prompt}]
+            response_format={"type": "json_object"},
+            messages=[{"role":"user","content":_triage_prompt(text, subject, max_len)}]
         )
-        out = r.choices[0].message.content.strip()
-        out = re.sub(r"^\W+|\W+$", "", out)
-        return (out[:max_len].strip() or heuristic_summary(text, max_len)), "ON"
+        return (*_parse_triage(r.choices[0].message.content, text, max_len), "ON")
     except Exception as e:
         LAST_AI_ERROR = f"{type(e).__name__}: {e}"
-        return heuristic_summary(text, max_len), "FALLBACK"
+        return "actionable", heuristic_summary(text, max_len), "FALLBACK"
+
+# --- Async variants (poller fans a batch of emails out concurrently) ---
+# The SDK already retries 429/5xx with exponential backoff + jitter; bump its retry budget
+# since a concurrent batch is more likely to brush the rate limit.
+AI_MAX_RETRIES = 5
 
-def ai_classify_label(text, subject, model="gpt-5-mini", api_key=None, base_url=None):
+def make_async_client(api_key=None, base_url=None):
     global LAST_AI_ERROR
-    if OpenAI is None:
-        return "actionable", "OFF"
-    api_key = api_key or os.getenv("OPENAI_API_KEY", "")
+    if AsyncOpenAI is None:
+        LAST_AI_ERROR = "OpenAI SDK not importable; install with: pip install openai"
+        return None
+    api_key = api_key or os.getenv("OPENAI_API_KEY","")
     if not api_key:
-        return "actionable", "OFF"
+        LAST_AI_ERROR = "OPENAI_API_KEY not set (env var or [ai] api_key)."
+        return None
+    kwargs = {"api_key": api_key, "max_retries": AI_MAX_RETRIES}
+    if base_url:
+        kwargs["base_url"] = base_url
+    return AsyncOpenAI(**kwargs)
+
+async def llm_summary_async(client, text, subject, model="gpt-5-mini", temperature=1, max_len=140):
+    global LAST_AI_ERROR
+    if client is None:
+        return heuristic_summary(text, max_len), "OFF"
     try:
-        kwargs = {"api_key": api_key}
-        if base_url:
-            kwargs["base_url"] = base_url
-        client = OpenAI(**kwargs)
-        prompt = (
-            "Classify this email for triage with ONE WORD only:\n"
-            "actionable = asks me to do something or likely needs a response\n"
-            "fyi        = informational only, no action needed\n"
-            "marketing  = promo/sales/newsletter/offer\n\n"
-            f"Subject: {subject}\n\n{text[:3000]}\n\n"
-            "Answer with exactly one label: actionable or fyi or marketing."
+        r = await client.chat.completions.create(
+            model=model, temperature=float(temperature),
+            messages=[{"role":"user","content":_summary_prompt(text, subject, max_len)}]
         )
-        resp = client.chat.completions.create(
+        return _clean_summary(r.choices[0].message.content, text, max_len), "ON"
+    except Exception as e:
+        LAST_AI_ERROR = f"{type(e).__name__}: {e}"
+        return heuristic_summary(text, max_len), "FALLBACK"
+
+async def ai_classify_label_async(client, text, subject, model="gpt-5-mini"):
+    global LAST_AI_ERROR
+    if client is None:
+        return "actionable", "OFF"
+    try:
+        resp = await client.chat.completions.create(
             model=model, temperature=1,
-            messages=[{"role":"user","content":prompt}]
+            messages=[{"role":"user","content":_classify_prompt(text, subject)}]
         )
-        label = (resp.choices[0].message.content or "").strip().lower()
-        if "market" in label:
-            label = "marketing"
-        elif "fyi" in label:
-            label = "fyi"
-        else:
-            label = "actionable"
-        return label, "ON"
+        return _parse_label(resp.choices[0].message.content), "ON"
     except Exception as e:
         LAST_AI_ERROR = f"{type(e).__name__}: {e}"
         return "actionable", "FALLBACK"
 
+async def ai_triage_async(client, text, subject, model="gpt-5-mini", temperature=1, max_len=140):
+    global LAST_AI_ERROR
+    if client is None:
+        return "actionable", heuristic_summary(text, max_len), "OFF"
+    try:
+        r = await client.chat.completions.create(
+            model=model, temperature=float(temperature),
+            response_format={"type": "json_object"},
+            messages=[{"role":"user","content":_triage_prompt(text, subject, max_len)}]
+        )
+        return (*_parse_triage(r.choices[0].message.content, text, max_len), "ON")
+    except Exception as e:
+        LAST_AI_ERROR = f"{type(e).__name__}: {e}"
+        return "actionable", heuristic_summary(text, max_len), "FALLBACK"
+
 # ----------------- Themes (with sampled border tones) -----------------
 LIGHT = {
     "root_bg": "#e9e9e9",  # sampled light chrome
@@ -295,22 +478,152 @@ def get_theme(cfg):
     t = cfg.get("ui", "theme", fallback="light").strip().lower()
     return DARK if t == "dark" else LIGHT
 
-# ----------------- Poller (logic unchanged) -----------------
+# ----------------- Poller -----------------
+FETCH_BATCH = 100
+_FETCH_UID_RE = re.compile(rb"UID (\d+)")
+MAX_BODY_CHARS = 8000
+_BLANK_RUN_RE = re.compile(r"\s+\n")
+
+def plain_text_body(msg):
+    # msg must be parsed with policy.default: get_body() picks the first inline text/plain
+    # part (attachments are never visited) and get_content() hands it back already decoded.
+    part = msg.get_body(preferencelist=("plain",))
+    if part is None and not msg.is_multipart() and msg.get_content_maintype() == "text":
+        part = msg
+    if part is None:
+        return ""
+    try:
+        return part.get_content()
+    except Exception:  # unknown charset / broken transfer encoding
+        return (part.get_payload(decode=True) or b"").decode("utf-8", errors="ignore")
+
+def parse_message(uid_s, raw):
+    # -> (uid, sender, received, subject, body) with the body already capped at MAX_BODY_CHARS
+    msg = email.message_from_bytes(raw, policy=email_policy.default)
+    subject = str(msg.get("Subject",""))
+    from_hdr = str(msg.get("From",""))
+    sender_email = parseaddr(from_hdr)[1] or "(unknown)"
+    date_hdr = str(msg.get("Date",""))
+    try:
+        dt_utc = parsedate_to_datetime(date_hdr)
+        if dt_utc.tzinfo is None:
+            dt_utc = dt_utc.replace(tzinfo=timezone.utc)
+        dt_local = dt_utc.astimezone()
+        received_str = dt_local.strftime("%Y-%m-%d %H:%M")
+    except Exception:
+        received_str = "(unknown date)"
+
+    # Cap at extract time: prompts only use the head, and the body is held until pass 3
+    body = _BLANK_RUN_RE.sub("\n", plain_text_body(msg)[:MAX_BODY_CHARS * 4])[:MAX_BODY_CHARS]
+    return uid_s, sender_email, received_str, subject, body
+
+def _chunks(seq, n):
+    for i in range(0, len(seq), n):
+        yield seq[i:i+n]
+
 class GmailPoller(threading.Thread):
     def __init__(self, cfg, status_callback=None):
         super().__init__(daemon=True)
         self.cfg = cfg
         self.poll_seconds = int(cfg.get("app","poll_seconds", fallback="300"))
         self.status_callback = status_callback
+        self.ai_concurrency = max(1, int(cfg.get("ai","max_concurrency", fallback="5")))
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self.M = None
 
     def run(self):
         log.info("Poller thread started (every %ss)", self.poll_seconds)
-        while True:
+        while not self._stopping.is_set():
             try:
                 self.check_mail()
             except Exception as e:
                 log.exception("Poll error: %s", e)
-            time.sleep(self.poll_seconds)
+                self._drop_imap()
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+        self._drop_imap()
+        log.info("Poller thread stopped")
+
+    def stop(self, timeout=5):
+        # Ask run() to exit after the current poll; True once the thread is gone, so the
+        # caller knows it's safe to close the DB.
+        self._stopping.set()
+        self._wake.set()
+        if self.is_alive():
+            self.join(timeout)
+        return not self.is_alive()
+
+    def _imap(self, host, user, pw, folder, use_ssl):
+        # One logged-in connection reused across polls; NOOP both checks it is alive and
+        # lets the server report new mail. Reconnect (TLS + LOGIN + SELECT) only when it died.
+        if self.M is not None:
+            try:
+                if self.M.noop()[0] == "OK":
+                    return self.M
+            except Exception:
+                pass
+            log.info("IMAP connection lost; reconnecting")
+            self._drop_imap()
+        M = imaplib.IMAP4_SSL(host) if use_ssl else imaplib.IMAP4(host)
+        M.login(user, pw)
+        M.select(folder)
+        self.M = M
+        return M
+
+    def _drop_imap(self):
+        M, self.M = self.M, None
+        if M is not None:
+            try:
+                M.logout()
+            except Exception:
+                pass
+
+    def poll_now(self):
+        # Cut the current sleep short; the poll itself runs on the poller thread.
+        self._wake.set()
+
+    async def _triage_all(self, pending, classify_enabled, drop_set, ai_enabled,
+                          model="gpt-5-mini", api_key=None, base_url=None, temperature=1):
+        # One (label, summary, ai_mode) per pending message, in order. With both classify and
+        # summarize on, a single fused triage call does both. At most ai_concurrency emails
+        # are in flight at once. Successful AI results are memoized in ai_cache.
+        client = make_async_client(api_key, base_url) if (classify_enabled or ai_enabled) else None
+        sem = asyncio.Semaphore(self.ai_concurrency)
+
+        async def triage(subject, body):
+            key = ai_cache_key(subject, body, model, classify_enabled, ai_enabled)
+            hit = get_ai_cache(key) if (classify_enabled or ai_enabled) else None
+            if hit and (hit[1] is not None or hit[0] in drop_set):
+                return hit[0], hit[1], "CACHED"
+            label, summary, ai_mode, ai_ok = await run(subject, body)
+            if ai_ok:
+                put_ai_cache(key, label, summary)
+            return label, summary, ai_mode
+
+        async def run(subject, body):
+            # -> (label, summary, ai_mode, ai_ok); ai_ok = the AI call(s) that ran succeeded,
+            # which is what makes the result worth caching (a heuristic summary is free to redo).
+            async with sem:
+                if classify_enabled and ai_enabled:
+                    label, summary, ai_mode = await ai_triage_async(client, body, subject, model=model, temperature=temperature, max_len=140)
+                    return label, summary, ai_mode, ai_mode == "ON"
+                label, cls_mode = "actionable", None
+                if classify_enabled:
+                    label, cls_mode = await ai_classify_label_async(client, body, subject, model=model)
+                    if label in drop_set:
+                        return label, None, cls_mode, cls_mode == "ON"
+                if ai_enabled:
+                    summary, ai_mode = await llm_summary_async(client, body, subject, model=model, temperature=temperature, max_len=140)
+                    return label, summary, ai_mode, ai_mode == "ON"
+                summary, ai_mode = heuristic_summary(body, 140), "OFF"
+                return label, summary, ai_mode, cls_mode == "ON"
+
+        try:
+            return await asyncio.gather(*(triage(subject, body) for (_, _, _, subject, body) in pending))
+        finally:
+            if client is not None:
+                await client.close()
 
     def check_mail(self):
         host   = self.cfg.get("imap","server",  fallback="imap.gmail.com")
@@ -326,9 +639,7 @@ class GmailPoller(threading.Thread):
             log.warning("IMAP creds not set; skipping poll")
             return
 
-        M = imaplib.IMAP4_SSL(host) if use_ssl else imaplib.IMAP4(host)
-        M.login(user, pw)
-        M.select(folder)
+        M = self._imap(host, user, pw, folder, use_ssl)
 
         last_uid = get_metadata("last_uid", "0")
         base_q = f"(UID {int(last_uid)+1}:*)" if last_uid else "ALL"
@@ -336,13 +647,12 @@ class GmailPoller(threading.Thread):
 
         typ, data = M.uid("search", None, query)
         if typ != "OK":
-            M.logout()
+            self._drop_imap()
             if self.status_callback: self.status_callback("IMAP ERR")
             return
 
         uids = [u.decode() for u in data[0].split() if u]
         if not uids:
-            M.logout()
             if self.status_callback: self.status_callback("IMAP OK (no new)")
             return
 
@@ -353,85 +663,106 @@ class GmailPoller(threading.Thread):
         temperature = self.cfg.get("ai","temperature", fallback="1")
         ai_enabled = self.cfg.getboolean("ai","enabled", fallback=True)
 
+        classify_enabled = get_bool(self.cfg, "ai", "classify_before_add", True)
+        drop_labels_csv  = self.cfg.get("ai", "drop_labels", fallback="marketing, fyi")
+        drop_set = frozenset(x.strip().lower() for x in drop_labels_csv.split(",") if x.strip())
+
         max_seen_uid = int(last_uid or 0)
         last_ai_mode = None
         new_count = 0
         dropped = 0
 
+        # Pass 1: bulk-fetch (one FETCH per FETCH_BATCH UIDs) + parse every new message
+        todo = []
         for uid_s in uids:
             if is_uid_processed(uid_s):
                 max_seen_uid = max(max_seen_uid, int(uid_s))
-                continue
-
-            typ, msg_data = M.uid("fetch", uid_s.encode(), "(BODY.PEEK[])")
-            if typ != "OK" or not msg_data or not msg_data[0]:
-                continue
-
-            raw = msg_data[0][1]
-            msg = email.message_from_bytes(raw)
-            subject = msg.get("Subject","")
-            from_hdr = msg.get("From","")
-            sender_email = parseaddr(from_hdr)[1] or "(unknown)"
-            date_hdr = msg.get("Date","")
-            try:
-                dt_utc = parsedate_to_datetime(date_hdr)
-                if dt_utc.tzinfo is None:
-                    dt_utc = dt_utc.replace(tzinfo=timezone.utc)
-                dt_local = dt_utc.astimezone()
-                received_str = dt_local.strftime("%Y-%m-%d %H:%M")
-            except Exception:
-                received_str = "(unknown date)"
-
-            body = ""
-            if msg.is_multipart():
-                for part in msg.walk():
-                    ctype = part.get_content_type()
-                    disp = str(part.get("Content-Disposition",""))
-                    if ctype == "text/plain" and "attachment" not in disp.lower():
-                        payload = part.get_payload(decode=True) or b""
-                        try:
-                            body += payload.decode(part.get_content_charset() or "utf-8", errors="ignore") + "\n"
-                        except Exception:
-                            body += payload.decode("utf-8", errors="ignore") + "\n"
             else:
-                payload = msg.get_payload(decode=True) or b""
+                todo.append(uid_s)
+
+        # Each chunk is parsed (bodies capped) as soon as it arrives and its raw bytes dropped,
+        # so only one chunk of full messages is ever in memory.
+        pending = []
+        uid_ceiling = None  # a failed chunk must be searched again next poll: don't move last_uid past it
+        for chunk in _chunks(todo, FETCH_BATCH):
+            typ, msg_data = M.uid("fetch", ",".join(chunk).encode(), "(UID BODY.PEEK[])")
+            if typ != "OK" or not msg_data:
+                if uid_ceiling is None:
+                    uid_ceiling = int(chunk[0]) - 1
+                    log.warning("FETCH failed for UIDs %s..%s; retrying next poll", chunk[0], chunk[-1])
+                continue
+            # Response interleaves (b'N (UID u BODY[] {len}', raw) tuples with b')' closers;
+            # some servers put the UID after the literal, i.e. in the closer (b' UID u)').
+            raw_by_uid = {}
+            orphan = None
+            for item in msg_data:
+                if isinstance(item, tuple) and len(item) >= 2:
+                    m = _FETCH_UID_RE.search(item[0])
+                    orphan = None if m else item[1]
+                    if m:
+                        raw_by_uid[m.group(1).decode()] = item[1]
+                elif orphan is not None and isinstance(item, bytes):
+                    m = _FETCH_UID_RE.search(item)
+                    if m:
+                        raw_by_uid[m.group(1).decode()] = orphan
+                    orphan = None
+            del msg_data, orphan
+
+            for uid_s in chunk:
+                raw = raw_by_uid.pop(uid_s, None)
+                if not raw:
+                    continue
                 try:
-                    body += payload.decode(msg.get_content_charset() or "utf-8", errors="ignore")
-                except Exception:
-                    body += payload.decode("utf-8", errors="ignore")
-
-            classify_enabled = get_bool(self.cfg, "ai", "classify_before_add", True)
-            drop_labels_csv  = self.cfg.get("ai", "drop_labels", fallback="marketing, fyi")
-            drop_set = {x.strip().lower() for x in drop_labels_csv.split(",") if x.strip()}
-
-            if classify_enabled:
-                cls_label, cls_mode = ai_classify_label(body, subject, model=model, api_key=ai_key, base_url=base_url)
-                if cls_label in drop_set:
+                    pending.append(parse_message(uid_s, raw))
+                except Exception as e:
+                    # policy.default is strict about malformed headers; skip this one message
+                    # for good rather than failing (and retrying) the whole poll
+                    log.warning("Skip UID=%s: unparseable message (%s: %s)", uid_s, type(e).__name__, e)
+                    mark_uid_processed(uid_s)
+                    max_seen_uid = max(max_seen_uid, int(uid_s))
+            del raw_by_uid, raw
+
+        # Pass 2: classify + summarize the whole batch concurrently
+        results = []
+        if pending:
+            prune_ai_cache()  # once per poll, so a long-running session doesn't grow it forever
+            results = asyncio.run(self._triage_all(
+                pending, classify_enabled, drop_set, ai_enabled,
+                model=model, api_key=ai_key, base_url=base_url, temperature=temperature))
+
+        # Pass 3: store in UID order, one transaction (one WAL commit) for the whole batch
+        seen_uids = []
+        now_iso = utc_now_iso()
+        with db_batch():
+            for (uid_s, sender_email, received_str, subject, body), (label, summary, ai_mode) in zip(pending, results):
+                if classify_enabled and label in drop_set:
                     dropped += 1
                     mark_uid_processed(uid_s)
                     max_seen_uid = max(max_seen_uid, int(uid_s))
                     continue
 
-            snippet = (body.strip().splitlines() or [""])[0][:140]
+                snippet = (body.strip().splitlines() or [""])[0][:140]
+                last_ai_mode = ai_mode
 
-            if ai_enabled:
-                summary, ai_mode = llm_summary(body, subject, model=model, api_key=ai_key, base_url=base_url, temperature=temperature, max_len=140)
-            else:
-                summary, ai_mode = heuristic_summary(body, 140), "OFF"
-            last_ai_mode = ai_mode
+                created = add_task(sender_email, received_str, summary, subject=subject, snippet=snippet, email_uid=uid_s, now_iso=now_iso)
+                if created:
+                    new_count += 1
+                    seen_uids.append(uid_s)
+
+                max_seen_uid = max(max_seen_uid, int(uid_s))
 
-            line = f"From: {sender_email} | Received: {received_str} | Summary: {summary}"
-            created = add_task(line, subject=subject, snippet=snippet, email_uid=uid_s)
-            if created and mark_as_read:
+            if uid_ceiling is not None:
+                max_seen_uid = max(int(last_uid or 0), min(max_seen_uid, uid_ceiling))
+            save_metadata("last_uid", str(max_seen_uid))
+
+        # Flag as read only once the tasks are committed (and outside the DB lock). One STORE
+        # per FETCH_BATCH UIDs; .SILENT skips the per-message FETCH responses.
+        if mark_as_read:
+            for chunk in _chunks(seen_uids, FETCH_BATCH):
                 try:
-                    M.uid("store", uid_s.encode(), "+FLAGS", r"(\Seen)")
+                    M.uid("store", ",".join(chunk).encode(), "+FLAGS.SILENT", r"(\Seen)")
                 except Exception:
                     pass
-
-            max_seen_uid = max(max_seen_uid, int(uid_s))
-
-        save_metadata("last_uid", str(max_seen_uid))
-        M.logout()
         if self.status_callback and last_ai_mode:
             self.status_callback(f"AI {last_ai_mode} | +{new_count} / dropped {dropped}")
 
@@ -442,6 +773,11 @@ class StickyUI(tk.Tk):
         self.cfg = cfg
         self.title("AI Email Sticky Note")
         self._last_rows_key = None
+        self._row_widgets = {}    # tid -> widget handles (see build_row)
+        self._row_order = []
+        self._row_style_key = None
+        self._row_palette = {}
+        self._empty_label = None
 
         # UI prefs
         self.font_size = int(cfg.get("ui","font_size", fallback="10"))
@@ -538,9 +874,11 @@ class StickyUI(tk.Tk):
         self.refresh_ui()
         self.after(self.ui_refresh_seconds * 1000, self.periodic_refresh)
 
-        # Poller
-        self.poller = GmailPoller(cfg, status_callback=self.set_status)
+        # Poller (status goes through a queue: Tk must only be touched from this thread)
+        self.poll_events = queue.Queue()
+        self.poller = GmailPoller(cfg, status_callback=self.poll_events.put)
         self.poller.start()
+        self.after(250, self.drain_poll_events)
 
         # Hotkeys
         self.bind_all("<Control-r>", lambda e: self.poll_now())
@@ -571,14 +909,20 @@ class StickyUI(tk.Tk):
         self.refresh_ui()
 
     def poll_now(self):
-        threading.Thread(target=self._poll_once, daemon=True).start()
+        self.set_status("Manual poll…")
+        self.poller.poll_now()
 
-    def _poll_once(self):
+    def drain_poll_events(self):
+        got = False
         try:
-            self.set_status("Manual poll…")
-            GmailPoller(self.cfg, status_callback=self.set_status).check_mail()
-        except Exception as e:
-            log.exception("Manual poll error: %s", e)
+            while True:
+                self.set_status(self.poll_events.get_nowait())
+                got = True
+        except queue.Empty:
+            pass
+        if got:
+            self.refresh_ui()  # a poll just finished; show new tasks without waiting for the timer
+        self.after(250, self.drain_poll_events)
 
     def set_status(self, text):
         self.status_var.set(text)
@@ -595,9 +939,9 @@ class StickyUI(tk.Tk):
         rows, active_count, completed_count = list_active_tasks(self.retention_hours, return_counts=True)
 
         rows_key= (
-            tuple((tid, int(done)) for (tid, _, done, _, _) in rows),
+            tuple((r[0], int(r[4])) for r in rows),
             active_count, completed_count,
-            self.theme["bg"],
+            self.theme["bg"], self.colorful,
         )
         if rows_key == self._last_rows_key:
             self.statusbar.config(text=f"Active: {active_count}  |  Completed: {completed_count}")
@@ -607,17 +951,7 @@ class StickyUI(tk.Tk):
         # Remember scroll position
         y0 = self.canvas.yview()
 
-        # Build offscreen
-        temp = tk.Frame(self.canvas, bg=self.theme["bg"])
-        self.build_rows(temp, rows)
-
-        # Swap atomically
-        old = self.list_frame
-        self.canvas.itemconfigure(self.list_win, window=temp)
-        self.list_frame = temp
-        self.list_frame.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
-        if old is not None:
-            old.destroy()
+        self.sync_rows(rows)
 
         # Restore scroll
         if y0 and len(y0) == 2:
@@ -626,59 +960,108 @@ class StickyUI(tk.Tk):
         # Status
         self.statusbar.config(text=f"Active: {active_count}  |  Completed: {completed_count}")
 
-
-    def build_rows(self, parent, rows):
-            if not rows:
-                tk.Label(parent, text="No tasks (yet!)",
-                        bg=self.theme["bg"], fg=self.theme["fg"]).pack(anchor="w", padx=6, pady=6)
-                return
-
-            for tid, text, done, _, subject in rows:
-                from_match = re.search(r"From:\s*(.*?)\s*\|", text)
-                recv_match = re.search(r"Received:\s*([^|]+)", text)
-                summ_match = re.search(r"Summary:\s*(.*)$", text)
-                from_val = from_match.group(1).strip() if from_match else ""
-                recv_val = recv_match.group(1).strip() if recv_match else ""
-                summ_val = summ_match.group(1).strip() if summ_match else text
-
-                row = tk.Frame(parent, bg=self.theme["bg"])
+    def sync_rows(self, rows):
+        # Row widgets are cached per task id: only new tasks get built, vanished ones destroyed,
+        # and survivors are recolored when their done-state (or the theme) changed.
+        style_key = (self.theme["bg"], self.colorful)
+        restyle = style_key != self._row_style_key
+        if restyle:
+            self._row_style_key = style_key
+            # (from, received, summary) fg per done-state, worked out once per theme instead of per row
+            self._row_palette = {
+                False: (self.theme["from_fg"] if self.colorful else self.theme["fg"],
+                        self.theme["received_fg"] if self.colorful else self.theme["fg"],
+                        self.theme["summary_fg"]),
+                True: (COMPLETE_GREEN,) * 3,
+            }
+
+        new_ids = {r[0] for r in rows}
+        for tid in [t for t in self._row_widgets if t not in new_ids]:
+            self._row_widgets.pop(tid)["row"].destroy()
+
+        for tid, sender, received_at, summary, done, _, subject in rows:
+            done = bool(done)
+            h = self._row_widgets.get(tid)
+            if h is None:
+                self._row_widgets[tid] = self.build_row(tid, sender, received_at, summary, done)
+                continue
+            if restyle:
+                self.restyle_row(h)
+            if restyle or h["done"] != done:
+                self.set_row_done(h, done)
+
+        # Re-pack only when the visible order changed (new task, or one moved to completed)
+        order = [r[0] for r in rows]
+        if order != self._row_order:
+            for tid in order:
+                row = self._row_widgets[tid]["row"]
+                row.pack_forget()
                 row.pack(fill="x", pady=4, padx=6)
+            self._row_order = order
+
+        if rows and self._empty_label is not None:
+            self._empty_label.destroy()
+            self._empty_label = None
+        elif not rows:
+            if self._empty_label is None:
+                self._empty_label = tk.Label(self.list_frame, text="No tasks (yet!)")
+                self._empty_label.pack(anchor="w", padx=6, pady=6)
+            self._empty_label.configure(bg=self.theme["bg"], fg=self.theme["fg"])
+
+    def build_row(self, tid, from_val, recv_val, summ_val, done):
+        # Colors go in at creation so a new row costs no follow-up configure() calls
+        bg = self.theme["bg"]
+        from_fg, recv_fg, summ_fg = self._row_palette[done]
+        row = tk.Frame(self.list_frame, bg=bg)
+
+        var = tk.BooleanVar(value=done)
+        check = tk.Checkbutton(
+            row, variable=var, bg=bg,
+            font=("Segoe UI", max(self.font_size+2, 12)),
+            command=lambda t=tid, v=var: (mark_task_completed(t, v.get()), self.refresh_ui())
+        )
+        check.pack(side="left", padx=(0, 6))
+
+        block = tk.Frame(row, bg=bg)
+        block.pack(side="left", fill="x", expand=True)
+
+        line1 = tk.Frame(block, bg=bg)
+        line1.pack(anchor="w", fill="x")
+        from_lbl = tk.Label(line1, text=f"From: {from_val}", bg=bg, fg=from_fg, font=("Segoe UI", 9, "bold"))
+        from_lbl.pack(side="left")
+        spacer = tk.Label(line1, text="   ", bg=bg, fg=self.theme["fg"])
+        spacer.pack(side="left")
+        recv_lbl = tk.Label(line1, text=f"Received: {recv_val}", bg=bg, fg=recv_fg, font=("Segoe UI", 9))
+        recv_lbl.pack(side="left")
+
+        line2 = tk.Frame(block, bg=bg)
+        line2.pack(anchor="w", fill="x")
+        sum_lbl = tk.Label(line2, text=f"Summary: {summ_val}", bg=bg, fg=summ_fg, wraplength=440, justify="left")
+        sum_lbl.pack(side="left", fill="x", expand=True)
+
+        del_btn = tk.Button(row, text="❌", bg=bg, relief="flat",
+                            command=lambda t=tid: (delete_task(t), self.refresh_ui()))
+        del_btn.pack(side="right")
+
+        return {"row": row, "var": var, "done": done,
+                "fg": (from_lbl, recv_lbl, sum_lbl),
+                "bg": (row, check, block, line1, line2, del_btn, from_lbl, recv_lbl, sum_lbl, spacer),
+                "spacer": spacer}
+
+    def restyle_row(self, h):
+        # Theme / colorful toggle only
+        bg = self.theme["bg"]
+        for w in h["bg"]:
+            w.configure(bg=bg)
+        h["spacer"].configure(fg=self.theme["fg"])
+
+    def set_row_done(self, h, done):
+        for w, fg in zip(h["fg"], self._row_palette[done]):
+            w.configure(fg=fg)
+        if h["var"].get() != done:  # already set when the user clicked the box
+            h["var"].set(done)
+        h["done"] = done
 
-                var = tk.BooleanVar(value=bool(done))
-                tk.Checkbutton(
-                    row, variable=var, bg=self.theme["bg"],
-                    font=("Segoe UI", max(self.font_size+2, 12)),
-                    command=lambda t=tid, v=var: (mark_task_completed(t, v.get()), self.refresh_ui())
-                ).pack(side="left", padx=(0, 6))
-
-                block = tk.Frame(row, bg=self.theme["bg"])
-                block.pack(side="left", fill="x", expand=True)
-
-                line1 = tk.Frame(block, bg=self.theme["bg"])
-                line1.pack(anchor="w", fill="x")
-                from_fg = self.theme["from_fg"] if self.colorful else self.theme["fg"]
-                recv_fg = self.theme["received_fg"] if self.colorful else self.theme["fg"]
-
-                from_lbl = tk.Label(line1, text=f"From: {from_val}", bg=self.theme["bg"], fg=from_fg, font=("Segoe UI", 9, "bold"))
-                from_lbl.pack(side="left")
-                tk.Label(line1, text="   ", bg=self.theme["bg"], fg=self.theme["fg"]).pack(side="left")
-                recv_lbl = tk.Label(line1, text=f"Received: {recv_val}", bg=self.theme["bg"], fg=recv_fg, font=("Segoe UI", 9))
-                recv_lbl.pack(side="left")
-
-                line2 = tk.Frame(block, bg=self.theme["bg"])
-                line2.pack(anchor="w", fill="x")
-                sum_label = tk.Label(line2, text=f"Summary: {summ_val}", bg=self.theme["bg"], fg=self.theme["summary_fg"], wraplength=440, justify="left")
-                sum_label.pack(side="left", fill="x", expand=True)
-
-                if done:
-                    green = COMPLETE_GREEN
-                    from_lbl.configure(fg=green)
-                    recv_lbl.configure(fg=green)
-                    sum_label.configure(fg=green)
-
-                tk.Button(row, text="❌", bg=self.theme["bg"], relief="flat",
-                        command=lambda t=tid: (delete_task(t), self.refresh_ui())).pack(side="right")
-                
     # Help items (unchanged)
     def self_test_ai(self):
         sample_subject = "Order status and scheduling"
@@ -696,9 +1079,9 @@ class StickyUI(tk.Tk):
         if not enabled:
             messagebox.showinfo("AI Self-Test", "AI is disabled in config.ini ([ai] enabled=false)."); return
 
-        summary, mode = llm_summary(sample_body, sample_subject, model=model, api_key=ai_key, base_url=base_url, temperature=temperature, max_len=140)
+        label, summary, mode = ai_triage(sample_body, sample_subject, model=model, api_key=ai_key, base_url=base_url, temperature=temperature, max_len=140)
         sdk_ver = getattr(_openai_pkg, "__version__", "(unknown)")
-        msg = f"Mode: {mode}\nModel: {model}\nOpenAI SDK: {sdk_ver}\nBase URL: {base_url or '(default)'}\nTemperature: {temperature}\n\nSummary:\n{summary}"
+        msg = f"Mode: {mode}\nModel: {model}\nOpenAI SDK: {sdk_ver}\nBase URL: {base_url or '(default)'}\nTemperature: {temperature}\n\nLabel: {label}\nSummary:\n{summary}"
         messagebox.showinfo("AI Self-Test Result", msg)
         self.set_status(f"AI {mode}")
 
@@ -728,6 +1111,12 @@ class StickyUI(tk.Tk):
         with open(CONFIG_PATH, "w") as f:
             self.cfg.write(f)
         self.destroy()
+        if self.poller.stop():
+            close_db()
+        else:
+            # Still mid-poll (network); closing now would pull the connection out from under it.
+            # The OS reclaims it at exit and WAL keeps the DB consistent.
+            log.info("Poller still busy at exit; leaving DB open")
 
 # ----------------- Main -----------------
 if __name__ == "__main__":